@@ -28,6 +28,18 @@ UV_API_URL = "https://api.weatherapi.com/v1/current.json"
 MAPBOX_API_KEY = os.getenv("MAPBOX_API_KEY")
 MAPBOX_GEOCODING_URL = "https://api.mapbox.com/geocoding/v5/mapbox.places"
 
+# Shared call budgets for the upstream APIs (see uv_tracker.budget)
+# Refill rates roughly match the monthly plan quotas: 1M WeatherAPI and 100k Mapbox calls per month
+UPSTREAM_BUDGETS = {
+    "weatherapi": {"capacity": 600, "refill_per_second": 0.38},
+    "mapbox": {"capacity": 300, "refill_per_second": 0.038},
+}
+# Directory holding the budget state files shared by all workers on this host (default: system temp dir)
+UPSTREAM_BUDGET_DIR = os.getenv("UPSTREAM_BUDGET_DIR")
+
+# Delivery backend used by the reminder scheduler (manage.py run_reminder_scheduler)
+REMINDER_BACKEND = os.getenv("REMINDER_BACKEND", "uv_tracker.reminders.ConsoleBackend")
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -61,6 +73,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'uv_tracker.middleware.TrafficCaptureMiddleware',  # Does nothing unless TRAFFIC_CAPTURE_LOG is set
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,6 +83,9 @@ MIDDLEWARE = [
     'csp.middleware.CSPMiddleware',
 ]
 
+# Optional request capture for load testing, replay it with manage.py replay_traffic
+TRAFFIC_CAPTURE_LOG = os.getenv("TRAFFIC_CAPTURE_LOG")
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -100,6 +116,19 @@ DATABASES = {
 }
 
 
+# Cache
+# Holds rate-limit counters and cached upstream results (see uv_tracker.utils)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Reminder
+
+
+@admin.register(Reminder)
+class ReminderAdmin(admin.ModelAdmin):
+    list_display = ("recipient", "message", "next_fire_at", "interval", "active", "last_fired_at")
+    list_filter = ("active",)
+    search_fields = ("recipient",)
@@ -0,0 +1,160 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to locking within this process only
+    fcntl = None
+
+# Request priorities. Interactive calls (a user waiting on uv_index/address_suggestions, the
+# default) may use the whole bucket; background/batch jobs should pass BACKGROUND so they
+# only use what is above the reserve.
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+# Time constant (seconds) of the moving average used for the burn rate
+BURN_RATE_WINDOW = 300
+
+# After the upstream itself reports an exhausted quota, all calls are held back for this long,
+# doubling on each consecutive quota error up to the maximum
+BLOCK_INITIAL_SECONDS = 60
+BLOCK_MAX_SECONDS = 60 * 60
+
+thread_lock = threading.Lock()
+
+
+def budget_dir():
+    path = getattr(settings, "UPSTREAM_BUDGET_DIR", None) or os.path.join(tempfile.gettempdir(), "sun_protection_budgets")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class UpstreamBudget:
+    """
+    Token bucket for one upstream API, shared by every worker process on the host.
+
+    The bucket lives in a small JSON file guarded by an exclusive flock, so no external
+    service is needed. Tokens refill continuously at `refill_per_second` up to `capacity`.
+    Background requests are refused once the bucket falls to `background_reserve`
+    (a fraction of capacity), leaving the rest for interactive requests.
+    """
+
+    def __init__(self, name, capacity, refill_per_second, background_reserve=0.5):
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.background_reserve = background_reserve
+        self.path = os.path.join(budget_dir(), f"{name}.json")
+
+    @contextmanager
+    def state(self):
+        """
+        Yields the bucket state, refilled up to now, and writes it back afterwards.
+        """
+        with thread_lock, open(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600), "r+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                fresh = {
+                    "tokens": self.capacity, "updated": now, "burn": 0.0,
+                    "blocked_until": 0.0, "backoff": 0.0, "granted": {}, "denied": {},
+                }
+                try:
+                    # Missing keys (an empty or older file) fall back to the fresh values
+                    state = {**fresh, **json.loads(f.read())}
+                    elapsed = max(0.0, now - float(state["updated"]))
+                except (ValueError, TypeError, KeyError):
+                    state, elapsed = fresh, 0.0
+
+                state["tokens"] = min(self.capacity, state["tokens"] + elapsed * self.refill_per_second)
+                state["burn"] *= math.exp(-elapsed / BURN_RATE_WINDOW)
+                state["updated"] = now
+
+                yield state
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()  # Must reach the file before the lock is released
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self, priority=INTERACTIVE, cost=1):
+        """
+        Takes `cost` tokens if the priority allows it. Returns False if the call should not be made.
+        """
+        floor = self.capacity * self.background_reserve if priority == BACKGROUND else 0
+        with self.state() as state:
+            if state["updated"] < state["blocked_until"] or state["tokens"] - cost < floor:
+                state["denied"][priority] = state["denied"].get(priority, 0) + 1
+                return False
+            state["tokens"] -= cost
+            state["burn"] += cost / BURN_RATE_WINDOW
+            state["granted"][priority] = state["granted"].get(priority, 0) + 1
+            return True
+
+    def block(self, until=None):
+        """
+        Refuses all calls until `until` (a Unix timestamp, e.g. the upstream's quota reset time)
+        or, if that isn't known, for an exponential backoff. Used when the upstream itself
+        reports an exhausted quota, so no worker keeps calling it.
+        """
+        with self.state() as state:
+            now = state["updated"]
+            if until is None:
+                if now < state["blocked_until"]:
+                    # Requests already in flight when the block started: nothing new to learn
+                    return
+                # Blocked again right after the previous block ended: back off further
+                if now < state["blocked_until"] + state["backoff"]:
+                    backoff = min(state["backoff"] * 2, BLOCK_MAX_SECONDS)
+                else:
+                    backoff = BLOCK_INITIAL_SECONDS
+                state["backoff"] = backoff
+                until = now + backoff
+            state["blocked_until"] = max(state["blocked_until"], until)
+            state["tokens"] = 0
+
+    def status(self):
+        """
+        Returns the current budget and burn-rate metrics.
+        """
+        with self.state() as state:
+            burn = state["burn"]
+            net_burn = burn - self.refill_per_second
+            return {
+                "name": self.name,
+                "tokens": state["tokens"],
+                "capacity": self.capacity,
+                "refill_per_minute": self.refill_per_second * 60,
+                "burn_per_minute": burn * 60,
+                "seconds_until_empty": state["tokens"] / net_burn if net_burn > 0 else None,
+                "blocked_for": max(0.0, state["blocked_until"] - state["updated"]),
+                "granted": dict(state["granted"]),
+                "denied": dict(state["denied"]),
+            }
+
+
+def get_budget(name):
+    """
+    Returns the budget for an upstream, configured by settings.UPSTREAM_BUDGETS.
+    """
+    return UpstreamBudget(name, **settings.UPSTREAM_BUDGETS[name])
+
+
+def acquire(name, priority=INTERACTIVE):
+    return get_budget(name).acquire(priority)
+
+
+def status():
+    return [get_budget(name).status() for name in settings.UPSTREAM_BUDGETS]
@@ -0,0 +1,291 @@
+import csv
+import re
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from uv_tracker.models import CancerData, DataVersion
+
+# AIHW workbooks use a few different spellings for the same column
+HEADER_ALIASES = {
+    "state": "state",
+    "state_or_territory": "state",
+    "state/territory": "state",
+    "year": "year",
+    "data_type": "data_type",
+    "count": "count",
+    "cancer_type": "cancer_type",
+    "cancer_group/site": "cancer_type",
+    "cancer_group_/_site": "cancer_type",
+    "cancer_site": "cancer_type",
+    "sex": "sex",
+}
+REQUIRED_COLUMNS = {"year", "data_type", "count", "cancer_type"}
+
+# Range of models.IntegerField
+INT_MIN, INT_MAX = -2**31, 2**31 - 1
+
+# Workbooks often have a few title rows above the real header
+MAX_HEADER_SEARCH_ROWS = 50
+
+# Natural keys looked up per query, at up to 5 parameters each this stays well under
+# SQLite's limit on query parameters
+LOOKUP_CHUNK_SIZE = 150
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams an AIHW-style CSV or XLSX file into CancerData. "
+        "Values are cleaned once at load time and upserted in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to a .csv or .xlsx file")
+        parser.add_argument(
+            "--sheet",
+            help="Worksheet to read from an XLSX file (default: the first sheet)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of rows written per transaction (default: 5000)",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        if not path.exists():
+            raise CommandError(f"File not found: {path}")
+
+        suffix = path.suffix.lower()
+        if suffix == ".csv":
+            rows = self.read_csv(path)
+        elif suffix in (".xlsx", ".xlsm"):
+            rows = self.read_xlsx(path, options["sheet"])
+        else:
+            raise CommandError(f"Unsupported file type '{suffix}'. Use a .csv or .xlsx file.")
+
+        records = self.normalize(rows)
+
+        start = time.perf_counter()
+        created = updated = unchanged = duplicates = 0
+        try:
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                counts = self.upsert(batch)
+                created += counts["created"]
+                updated += counts["updated"]
+                unchanged += counts["unchanged"]
+                duplicates += counts["duplicates"]
+                if options["verbosity"] > 1:
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f"  {self.read:,} rows read ({self.read / elapsed:,.0f} rows/sec)"
+                    )
+        finally:
+            # Each batch commits on its own, so bump even if a later batch failed
+            if created or updated:
+                DataVersion.bump(DataVersion.CANCER_DATA)
+
+        elapsed = time.perf_counter() - start
+        version = DataVersion.current(DataVersion.CANCER_DATA)
+        if duplicates:
+            self.stdout.write(self.style.WARNING(
+                f"{duplicates:,} rows repeated an earlier row in the same batch and were ignored "
+                f"(the last value in each batch wins)."
+            ))
+
+        rate = self.read / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {self.read:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec): "
+            f"{created:,} created, {updated:,} updated, {unchanged:,} unchanged, "
+            f"{duplicates:,} duplicates, {self.skipped:,} skipped. "
+            f"Cancer data is now at version {version}."
+        ))
+
+    def read_csv(self, path):
+        """
+        Yields raw rows from a CSV file one at a time.
+        """
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.reader(f)
+
+    def read_xlsx(self, path, sheet=None):
+        """
+        Yields raw rows from an XLSX worksheet one at a time.
+        Read-only mode keeps memory flat regardless of the sheet size.
+        """
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            if sheet:
+                if sheet not in workbook.sheetnames:
+                    raise CommandError(
+                        f"Sheet '{sheet}' not found. Available sheets: {', '.join(workbook.sheetnames)}"
+                    )
+                worksheet = workbook[sheet]
+            else:
+                worksheet = workbook.worksheets[0]
+            yield from worksheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    def normalize(self, rows):
+        """
+        Finds the header row, then yields one cleaned dict per data row.
+        Rows with a missing or suppressed year/count (e.g. "n.p.") are skipped.
+        """
+        self.read = 0
+        self.skipped = 0
+
+        columns = None
+        for position, row in enumerate(rows):
+            if columns is None:
+                columns = self.match_header(row)
+                if columns is None and position >= MAX_HEADER_SEARCH_ROWS:
+                    raise CommandError(
+                        f"Could not find a header row with columns: {', '.join(sorted(REQUIRED_COLUMNS))}"
+                    )
+                continue
+
+            self.read += 1
+            values = {field: row[index] if index < len(row) else None for field, index in columns.items()}
+            year = clean_int(values.get("year"))
+            count = clean_int(values.get("count"))
+            cancer_type = clean_text(values.get("cancer_type"))
+            data_type = clean_text(values.get("data_type"))
+            if year is None or count is None or not cancer_type or not data_type:
+                self.skipped += 1
+                continue
+
+            yield {
+                "state": clean_text(values.get("state")),
+                "year": year,
+                "data_type": data_type,
+                "count": count,
+                "cancer_type": cancer_type,
+                "sex": clean_text(values.get("sex")),
+            }
+
+        if columns is None:
+            raise CommandError(
+                f"Could not find a header row with columns: {', '.join(sorted(REQUIRED_COLUMNS))}"
+            )
+
+    def match_header(self, row):
+        """
+        Returns a {field: column index} map if the row looks like the header, otherwise None.
+        """
+        columns = {}
+        for index, cell in enumerate(row):
+            if cell is None:
+                continue
+            name = re.sub(r"\s+", "_", str(cell).strip().lower())
+            field = HEADER_ALIASES.get(name)
+            if field and field not in columns:
+                columns[field] = index
+        return columns if REQUIRED_COLUMNS <= columns.keys() else None
+
+    def upsert(self, batch):
+        """
+        Writes one batch in a single transaction.
+        Rows matching an existing (state, year, data_type, cancer_type, sex) get their count updated,
+        everything else is inserted. Returns a dict of created/updated/unchanged/duplicates counts,
+        where duplicates are rows sharing a natural key with a later row in the same batch.
+        """
+        incoming = {natural_key(record): record for record in batch}
+        unchanged = 0
+
+        with transaction.atomic():
+            existing = self.find_existing(incoming.keys())
+            to_create = []
+            to_update = []
+            for key, record in incoming.items():
+                obj = existing.get(key)
+                if obj is None:
+                    to_create.append(CancerData(**record))
+                elif obj.count != record["count"]:
+                    obj.count = record["count"]
+                    to_update.append(obj)
+                else:
+                    unchanged += 1
+
+            CancerData.objects.bulk_create(to_create, batch_size=1000)
+            CancerData.objects.bulk_update(to_update, ["count"], batch_size=1000)
+
+        return {
+            "created": len(to_create),
+            "updated": len(to_update),
+            "unchanged": unchanged,
+            "duplicates": len(batch) - len(incoming),
+        }
+
+    def find_existing(self, keys):
+        """
+        Returns a {natural key: CancerData} map of the stored rows matching `keys`.
+        Looks up exactly those keys, so each batch reads about as many rows as it writes.
+        """
+        existing = {}
+        keys = list(keys)
+        for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            condition = Q(*(natural_key_filter(key) for key in keys[start:start + LOOKUP_CHUNK_SIZE]), _connector=Q.OR)
+            for obj in CancerData.objects.filter(condition).iterator():
+                existing.setdefault(natural_key(obj.__dict__), obj)
+        return existing
+
+
+def natural_key(values):
+    return (
+        values["state"],
+        values["year"],
+        values["data_type"],
+        values["cancer_type"],
+        values["sex"],
+    )
+
+
+def natural_key_filter(key):
+    """
+    Returns a Q matching one natural key. Blank state/sex are stored as NULL, which = doesn't match.
+    """
+    lookups = {}
+    for field, value in zip(("state", "year", "data_type", "cancer_type", "sex"), key):
+        if value is None:
+            lookups[f"{field}__isnull"] = True
+        else:
+            lookups[field] = value
+    return Q(**lookups)
+
+
+def clean_text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def clean_int(value):
+    """
+    Converts values like 1234, 1234.0, "1,234" or " 1234 " to an int.
+    Returns None for blanks, suppressed cells such as "n.p." or "..", and values
+    that don't fit in an IntegerField (including inf/NaN).
+    """
+    if value is None:
+        return None
+    if not isinstance(value, (int, float)):
+        value = str(value).replace(",", "").strip()
+    try:
+        number = int(round(float(value)))
+    except (ValueError, OverflowError):
+        return None
+    return number if INT_MIN <= number <= INT_MAX else None
@@ -0,0 +1,230 @@
+import json
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from urllib.parse import urlparse
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from uv_tracker import budget
+
+
+class StubResponse:
+    def __init__(self, data, status_code=200, headers=None):
+        self.data = data
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return self.data
+
+
+class StubUpstream:
+    """
+    Stands in for requests.get during a replay: returns canned WeatherAPI/Mapbox responses
+    after an optional artificial delay and counts calls per upstream host.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, **kwargs):
+        parsed = urlparse(url)
+        with self.lock:
+            self.calls[parsed.netloc] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if parsed.path.endswith("/search.json"):
+            return StubResponse([{"lat": -37.81, "lon": 144.96}])
+        if "weatherapi" in parsed.netloc:
+            return StubResponse({
+                "location": {"name": "Melbourne", "region": "Victoria", "country": "Australia"},
+                "current": {"uv": 6.0, "temp_c": 24.0},
+            })
+        if "mapbox" in parsed.netloc:
+            return StubResponse({"features": [{
+                "place_name": "Northcote, Victoria, Australia",
+                "context": [{"id": "postcode.1", "text": "3070"}],
+                "center": [144.99, -37.77],
+            }]})
+        return StubResponse({}, status_code=404)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def fake_ip(client):
+    """
+    Maps a recorded client hash to a stable private IPv4 address.
+    """
+    try:
+        return "10.{}.{}.{}".format(*bytes.fromhex(client[:6]))
+    except (ValueError, IndexError):
+        return "10.0.0.1"
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a log written by TrafficCaptureMiddleware against this project in-process, "
+        "with WeatherAPI and Mapbox stubbed out. Keeps the recorded inter-arrival times "
+        "(scaled by --speed) and reports latency percentiles and upstream call counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("log", help="Path to a traffic capture log")
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=1.0,
+            help="Replay speed multiplier, e.g. 1, 10 or 100 (default: 1)",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=32,
+            help="Maximum number of requests in flight at once (default: 32)",
+        )
+        parser.add_argument(
+            "--upstream-latency",
+            type=float,
+            default=0.0,
+            help="Milliseconds each stubbed upstream call takes (default: 0)",
+        )
+        parser.add_argument(
+            "--no-ratelimit",
+            action="store_true",
+            help="Disable django-ratelimit during the replay",
+        )
+
+    def handle(self, *args, **options):
+        speed = options["speed"]
+        if speed <= 0:
+            raise CommandError("--speed must be greater than 0.")
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        self.upstream = StubUpstream(latency=options["upstream_latency"] / 1000)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = Counter()
+        self.max_lag = 0.0
+
+        budget_dir = tempfile.TemporaryDirectory()
+        overrides = {
+            "TRAFFIC_CAPTURE_LOG": None,  # Don't record the replay itself
+            "ALLOWED_HOSTS": ["*"],
+            "UPSTREAM_BUDGET_DIR": budget_dir.name,  # Don't spend the live workers' budget
+        }
+        if options["no_ratelimit"]:
+            overrides["RATELIMIT_ENABLE"] = False
+
+        try:
+            log = open(options["log"])
+        except OSError as e:
+            raise CommandError(f"Could not open {options['log']}: {e}")
+
+        with log, budget_dir, override_settings(**overrides), mock.patch.object(requests, "get", self.upstream.get):
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                started = self.schedule(log, pool, speed)
+            elapsed = time.perf_counter() - started if started else 0
+            self.report(elapsed, budget.status())
+
+    def schedule(self, log, pool, speed):
+        """
+        Submits each logged request once its scaled offset from the first request has passed.
+        Returns the perf_counter value the replay started at.
+        """
+        first = started = None
+        for line_number, line in enumerate(log, 1):
+            try:
+                record = json.loads(line)
+                timestamp = float(record["t"])
+            except (ValueError, KeyError, TypeError):
+                self.stderr.write(f"Skipping malformed line {line_number}")
+                continue
+
+            if first is None:
+                first, started = timestamp, time.perf_counter()
+            due = started + max(0.0, timestamp - first) / speed
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            pool.submit(self.replay, record, due)
+        return started
+
+    def replay(self, record, due):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = Client()
+
+        path = record.get("p", "/")
+        extra = {
+            # Same fake address per recorded client, so per-IP rate limits still apply
+            "REMOTE_ADDR": fake_ip(record.get("c", "")),
+        }
+        if record.get("x"):
+            extra["HTTP_X_REQUESTED_WITH"] = "XMLHttpRequest"
+
+        start = time.perf_counter()
+        try:
+            response = client.generic(
+                record.get("m", "GET"),
+                f"{path}?{record['q']}" if record.get("q") else path,
+                secure=True,
+                **extra,
+            )
+            status = response.status_code
+        except Exception as e:
+            self.stderr.write(f"Error replaying {path}: {e}")
+            status = "error"
+        latency = (time.perf_counter() - start) * 1000
+
+        with self.lock:
+            self.latencies[path].append(latency)
+            self.statuses[status] += 1
+            self.max_lag = max(self.max_lag, start - due)
+
+    def report(self, elapsed, budgets):
+        total = sum(len(values) for values in self.latencies.values())
+        if not total:
+            self.stdout.write("No requests replayed.")
+            return
+
+        self.stdout.write(
+            f"Replayed {total:,} requests in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.1f} req/s), "
+            f"max start lag {self.max_lag * 1000:.0f} ms"
+        )
+        self.stdout.write("Statuses: " + ", ".join(f"{status}={count}" for status, count in sorted(self.statuses.items(), key=str)))
+
+        self.stdout.write(f"\n{'path':<30} {'count':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        rows = sorted(self.latencies.items(), key=lambda item: -len(item[1]))
+        rows.append(("(all)", [value for values in self.latencies.values() for value in values]))
+        for path, values in rows:
+            values.sort()
+            self.stdout.write(
+                f"{path[:30]:<30} {len(values):>7} {percentile(values, 0.5):>8.1f} "
+                f"{percentile(values, 0.9):>8.1f} {percentile(values, 0.99):>8.1f} {values[-1]:>8.1f}"
+            )
+
+        self.stdout.write("\nUpstream calls:")
+        for host, count in self.upstream.calls.most_common():
+            self.stdout.write(f"  {host}: {count}")
+        if not self.upstream.calls:
+            self.stdout.write("  none")
+
+        self.stdout.write("\nUpstream budgets:")
+        for entry in budgets:
+            denied = sum(entry["denied"].values())
+            self.stdout.write(f"  {entry['name']}: {entry['tokens']:.0f}/{entry['capacity']} tokens left, {denied} calls denied")
@@ -0,0 +1,43 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from uv_tracker.reminders import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the reminder scheduler. Active reminders are reloaded from the database on start, "
+        "so the process can be restarted at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Maximum number of reminders handed to the delivery backend at once (default: 500)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Seconds between checks for new or edited reminders (default: 5)",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        if options["poll_interval"] <= 0:
+            raise CommandError("--poll-interval must be greater than 0.")
+
+        scheduler = ReminderScheduler(
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+        )
+        signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: scheduler.stop())
+
+        self.stdout.write(f"Starting reminder scheduler with {type(scheduler.backend).__name__}.")
+        scheduler.run()
+        self.stdout.write(self.style.SUCCESS("Reminder scheduler stopped."))
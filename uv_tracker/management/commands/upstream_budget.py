@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from uv_tracker import budget
+
+
+class Command(BaseCommand):
+    help = "Shows the shared WeatherAPI/Mapbox call budgets and how fast they are being used."
+
+    def handle(self, *args, **options):
+        for entry in budget.status():
+            if entry["blocked_for"]:
+                outlook = f"blocked for {entry['blocked_for'] / 60:,.1f} min after a quota error"
+            elif entry["seconds_until_empty"] is None:
+                outlook = "not draining"
+            else:
+                outlook = f"empty in {entry['seconds_until_empty'] / 60:,.1f} min at this rate"
+
+            self.stdout.write(self.style.MIGRATE_HEADING(entry["name"]))
+            self.stdout.write(f"  tokens:    {entry['tokens']:,.1f} / {entry['capacity']:,}")
+            self.stdout.write(
+                f"  burn rate: {entry['burn_per_minute']:,.2f}/min "
+                f"(refill {entry['refill_per_minute']:,.2f}/min, {outlook})"
+            )
+            for priority in budget.PRIORITIES:
+                self.stdout.write(
+                    f"  {priority:<12} granted {entry['granted'].get(priority, 0):,}, "
+                    f"denied {entry['denied'].get(priority, 0):,}"
+                )
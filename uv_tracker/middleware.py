@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# Only these query parameters are recorded, anything else is dropped
+CAPTURED_PARAMS = {
+    "lat", "lon", "location", "query",
+    "year_from", "year_to", "state", "sex", "cancer_type", "data_type", "group_by",
+}
+# Coordinates are rounded to about 1 km so captured logs don't pinpoint anyone
+COORDINATE_PARAMS = {"lat", "lon"}
+# Typed addresses are replaced by a pseudonym, see pseudonymize()
+FREE_TEXT_PARAMS = {"location", "query"}
+MAX_VALUE_LENGTH = 100
+SKIPPED_PREFIXES = ("/static/", "/admin/")
+
+
+def client_hash(request):
+    """
+    Returns a short, stable pseudonym for the client's IP address.
+    Salted with SECRET_KEY so it can't be reversed by hashing every IPv4 address.
+    """
+    ip = request.META.get("REMOTE_ADDR", "")
+    return hashlib.sha256(f"{settings.SECRET_KEY}:{ip}".encode()).hexdigest()[:12]
+
+
+def pseudonymize(value):
+    """
+    Replaces free text with a salted hash of the same length.
+    Equal inputs (ignoring case and surrounding spaces, like the upstream caches do) map to
+    equal outputs, so replays keep the repeat pattern and query lengths without the address itself.
+    """
+    value = value.strip().lower()[:MAX_VALUE_LENGTH]
+    if not value:
+        return ""
+    digest = hashlib.sha256(f"{settings.SECRET_KEY}:{value}".encode()).hexdigest()
+    return (digest * (len(value) // len(digest) + 1))[:len(value)]
+
+
+def sanitize_query(query_dict):
+    """
+    Returns an urlencoded query string containing only allowlisted, truncated parameters,
+    with coordinates rounded and free text pseudonymized.
+    """
+    params = []
+    for key in sorted(query_dict.keys()):
+        if key not in CAPTURED_PARAMS:
+            continue
+        for value in query_dict.getlist(key):
+            if key in COORDINATE_PARAMS:
+                try:
+                    value = f"{float(value):.2f}"
+                except ValueError:
+                    value = pseudonymize(value)
+            elif key in FREE_TEXT_PARAMS:
+                value = pseudonymize(value)
+            params.append((key, value[:MAX_VALUE_LENGTH]))
+    return urlencode(params)
+
+
+class TrafficCaptureMiddleware:
+    """
+    Appends one compact JSON line per request to settings.TRAFFIC_CAPTURE_LOG,
+    for replaying later with `manage.py replay_traffic`.
+    Records: t (start time), m (method), p (path), q (sanitized query), d (duration ms),
+    s (status), c (client hash) and x (1 for XMLHttpRequest calls).
+    Disabled unless TRAFFIC_CAPTURE_LOG is set.
+    """
+
+    def __init__(self, get_response):
+        log_path = getattr(settings, "TRAFFIC_CAPTURE_LOG", None)
+        if not log_path:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # O_APPEND makes each single-line write land atomically at the end,
+        # even with several worker processes sharing the file
+        self.fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def __call__(self, request):
+        if request.path.startswith(SKIPPED_PREFIXES):
+            return self.get_response(request)
+
+        started_at = time.time()
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = (time.perf_counter() - start) * 1000
+
+        record = {
+            "t": round(started_at, 3),
+            "m": request.method,
+            "p": request.path,
+            "q": sanitize_query(request.GET),
+            "d": round(duration, 1),
+            "s": response.status_code,
+            "c": client_hash(request),
+        }
+        if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            record["x"] = 1
+        try:
+            os.write(self.fd, (json.dumps(record, separators=(",", ":")) + "\n").encode())
+        except OSError as e:
+            print(f"Error writing traffic capture log: {e}")
+        return response
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-19 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uv_tracker', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cancerdata',
+            index=models.Index(fields=['cancer_type', 'year', 'data_type'], name='cancerdata_natural_key_idx'),
+        ),
+    ]
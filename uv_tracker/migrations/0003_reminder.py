@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 07:07
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uv_tracker', '0002_dataversion_cancerdata_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.CharField(max_length=255)),
+                ('message', models.CharField(default='Time to reapply sunscreen!', max_length=255)),
+                ('next_fire_at', models.DateTimeField()),
+                ('interval', models.DurationField(blank=True, default=datetime.timedelta(seconds=7200), null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('last_fired_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['active', 'next_fire_at'], name='reminder_due_idx'), models.Index(fields=['updated_at'], name='reminder_updated_idx')],
+            },
+        ),
+    ]
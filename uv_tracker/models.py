@@ -1,4 +1,7 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import F
 
 class CancerData(models.Model):
     state = models.CharField(max_length=255, null=True, blank=True)
@@ -8,5 +11,72 @@ class CancerData(models.Model):
     cancer_type = models.CharField(max_length=255)
     sex = models.CharField(max_length=20, null=True, blank=True)  # Males, Females, Persons
 
+    class Meta:
+        indexes = [
+            # Natural key used by load_cancer_data to find rows to update
+            models.Index(fields=["cancer_type", "year", "data_type"], name="cancerdata_natural_key_idx"),
+        ]
+
     def __str__(self):
         return f"{self.cancer_type} ({self.data_type}) - {self.year}"
+
+
+class DataVersion(models.Model):
+    """
+    Monotonic version number for a dataset.
+    Bumped whenever the dataset is reloaded so caches can include it in their keys.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Dataset names
+    CANCER_DATA = "cancer_data"
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    @classmethod
+    def current(cls, name):
+        """
+        Returns the current version of a dataset (0 if it has never been loaded).
+        """
+        return cls.objects.filter(name=name).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, name):
+        """
+        Increments the version of a dataset and returns the new value.
+        """
+        with transaction.atomic():
+            obj, _ = cls.objects.select_for_update().get_or_create(name=name)
+            obj.version = F("version") + 1
+            obj.save(update_fields=["version", "updated_at"])
+            obj.refresh_from_db(fields=["version"])
+        return obj.version
+
+
+class Reminder(models.Model):
+    """
+    A sunscreen reminder delivered by the reminder scheduler (see uv_tracker.reminders).
+    Repeating reminders are moved forward by `interval` after each delivery,
+    one-off reminders (no interval) are deactivated.
+    """
+    recipient = models.CharField(max_length=255)  # Address understood by the delivery backend
+    message = models.CharField(max_length=255, default="Time to reapply sunscreen!")
+    next_fire_at = models.DateTimeField()
+    interval = models.DurationField(null=True, blank=True, default=timedelta(hours=2))
+    active = models.BooleanField(default=True)
+    last_fired_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["active", "next_fire_at"], name="reminder_due_idx"),
+            # Lets the scheduler cheaply pick up reminders created or edited since its last poll
+            models.Index(fields=["updated_at"], name="reminder_updated_idx"),
+        ]
+
+    def __str__(self):
+        return f"Reminder for {self.recipient} at {self.next_fire_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,211 @@
+import heapq
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from uv_tracker.models import Reminder
+
+DEFAULT_BACKEND = "uv_tracker.reminders.ConsoleBackend"
+
+# How long to wait before retrying reminders whose delivery failed
+RETRY_DELAY = 30
+
+# How long to wait before reloading after a database error (e.g. SQLite's "database is locked")
+DATABASE_RETRY_DELAY = 5
+
+# Each poll looks this far behind the previous one, so reminders saved just before a poll
+# but committed after it are still picked up
+POLL_OVERLAP = timedelta(seconds=30)
+
+# Keeps `pk__in` lookups under SQLite's bound-parameter limit
+MAX_IDS_PER_QUERY = 500
+
+
+class BaseBackend:
+    """
+    Delivery backends receive batches of due Reminder objects.
+    Raising an exception marks the whole batch as failed so it is retried later.
+    """
+
+    def send(self, reminders):
+        raise NotImplementedError
+
+
+class ConsoleBackend(BaseBackend):
+    """
+    Prints reminders to stdout. Useful for local development.
+    """
+
+    def send(self, reminders):
+        for reminder in reminders:
+            print(f"Reminder for {reminder.recipient}: {reminder.message}")
+
+
+class LocMemBackend(BaseBackend):
+    """
+    Keeps delivered reminders in memory (like Django's locmem email backend) so tests can inspect them.
+    """
+    outbox = []
+
+    def send(self, reminders):
+        LocMemBackend.outbox.extend(reminders)
+
+
+def get_backend():
+    """
+    Returns an instance of the backend configured by settings.REMINDER_BACKEND.
+    """
+    return import_string(getattr(settings, "REMINDER_BACKEND", DEFAULT_BACKEND))()
+
+
+class ReminderScheduler:
+    """
+    Fires due reminders from an in-memory min-heap of (fire timestamp, reminder id).
+
+    The database stays the source of truth: the heap is rebuilt from it on start-up,
+    new or edited reminders are picked up by polling `updated_at`, and every popped id
+    is re-checked against the database before delivery, so stale heap entries
+    (deleted, deactivated or rescheduled reminders) are simply dropped.
+    Between batches the scheduler sleeps until the next reminder is due or the next poll,
+    so it uses no CPU while idle.
+    """
+
+    def __init__(self, backend=None, batch_size=500, poll_interval=5.0):
+        self.backend = backend or get_backend()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.heap = []
+        self.last_poll = None
+        self.recently_polled = {}
+        self.stopped = threading.Event()
+
+    def load(self):
+        """
+        Rebuilds the heap from all active reminders. Returns the number loaded.
+        """
+        self.last_poll = timezone.now()
+        active = Reminder.objects.filter(active=True).values_list("id", "next_fire_at")
+        self.heap = [(fire_at.timestamp(), reminder_id) for reminder_id, fire_at in active.iterator(chunk_size=10000)]
+        heapq.heapify(self.heap)
+        return len(self.heap)
+
+    def poll(self):
+        """
+        Queues reminders created or changed since the previous poll. Returns the number queued.
+        """
+        started = timezone.now()
+        changed = Reminder.objects.filter(
+            active=True, updated_at__gte=self.last_poll - POLL_OVERLAP
+        ).values_list("id", "next_fire_at")
+        queued = 0
+        polled = {}
+        for reminder_id, fire_at in changed.iterator(chunk_size=10000):
+            polled[reminder_id] = fire_at.timestamp()
+            # Rows inside the overlap were usually queued by the previous poll already
+            if self.recently_polled.get(reminder_id) != polled[reminder_id]:
+                heapq.heappush(self.heap, (polled[reminder_id], reminder_id))
+                queued += 1
+        self.recently_polled = polled
+        self.last_poll = started
+        return queued
+
+    def fire_due(self, now=None):
+        """
+        Delivers up to `batch_size` due reminders in one backend call and reschedules them.
+        Returns the number of heap entries processed.
+        """
+        now_ts = time.time() if now is None else now.timestamp()
+        due_ids = set()
+        popped = 0
+        while self.heap and self.heap[0][0] <= now_ts and len(due_ids) < self.batch_size:
+            due_ids.add(heapq.heappop(self.heap)[1])
+            popped += 1
+        if not due_ids:
+            return 0
+
+        now = datetime.fromtimestamp(now_ts, tz=dt_timezone.utc)
+        due_ids = list(due_ids)
+        reminders = []
+        for i in range(0, len(due_ids), MAX_IDS_PER_QUERY):
+            reminders.extend(Reminder.objects.filter(
+                pk__in=due_ids[i:i + MAX_IDS_PER_QUERY], active=True, next_fire_at__lte=now
+            ))
+        if not reminders:
+            return popped
+
+        try:
+            self.backend.send(reminders)
+        except Exception as e:
+            print(f"Error delivering {len(reminders)} reminders, retrying in {RETRY_DELAY}s: {e}")
+            for reminder in reminders:
+                heapq.heappush(self.heap, (now_ts + RETRY_DELAY, reminder.id))
+            return popped
+
+        # Group rows by how far they move so each group is a single UPDATE
+        # (bulk_update builds a CASE per row, which is far too slow at this volume).
+        # updated_at is left alone so the next poll doesn't queue these reminders a second time.
+        finished = []
+        moved = defaultdict(list)
+        for reminder in reminders:
+            if reminder.interval and reminder.interval.total_seconds() > 0:
+                # Skip any periods missed while the scheduler was down
+                missed = (now - reminder.next_fire_at) // reminder.interval
+                delta = reminder.interval * (missed + 1)
+                moved[delta].append(reminder.id)
+                heapq.heappush(self.heap, ((reminder.next_fire_at + delta).timestamp(), reminder.id))
+            else:
+                finished.append(reminder.id)
+
+        with transaction.atomic():
+            for i in range(0, len(finished), MAX_IDS_PER_QUERY):
+                Reminder.objects.filter(pk__in=finished[i:i + MAX_IDS_PER_QUERY]).update(active=False, last_fired_at=now)
+            for delta, ids in moved.items():
+                for i in range(0, len(ids), MAX_IDS_PER_QUERY):
+                    Reminder.objects.filter(pk__in=ids[i:i + MAX_IDS_PER_QUERY]).update(
+                        next_fire_at=F("next_fire_at") + delta, last_fired_at=now
+                    )
+        return popped
+
+    def run(self):
+        """
+        Runs until stop() is called.
+        A database error doesn't end the loop: the heap is rebuilt from the database once it
+        can be read again, which also restores any entries popped before the error.
+        """
+        loaded = False
+        next_poll = 0.0
+        while not self.stopped.is_set():
+            try:
+                if not loaded:
+                    self.load()
+                    loaded = True
+                    next_poll = time.monotonic() + self.poll_interval
+
+                if self.fire_due() >= self.batch_size:
+                    continue  # More reminders are already due
+
+                if time.monotonic() >= next_poll:
+                    self.poll()
+                    next_poll = time.monotonic() + self.poll_interval
+            except DatabaseError as e:
+                close_old_connections()
+                print(f"Database error in reminder scheduler, reloading in {DATABASE_RETRY_DELAY}s: {e}")
+                loaded = False
+                self.stopped.wait(DATABASE_RETRY_DELAY)
+                continue
+
+            timeout = next_poll - time.monotonic()
+            if self.heap:
+                timeout = min(timeout, self.heap[0][0] - time.time())
+            if timeout > 0:
+                self.stopped.wait(timeout)
+
+    def stop(self):
+        self.stopped.set()
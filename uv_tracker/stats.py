@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Sum
+
+from uv_tracker.models import CancerData
+
+FILTER_FIELDS = ("state", "sex", "cancer_type", "data_type")
+GROUP_BY_FIELDS = ("year", "state", "sex", "cancer_type", "data_type")
+DEFAULT_GROUP_BY = ["year"]
+
+# Entries are keyed on the data version, so old ones just age out
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def parse_stats_query(params):
+    """
+    Validates the query string of the cancer stats API and returns it in a canonical form,
+    so equivalent requests (reordered or repeated values) share one cache entry.
+    Raises ValueError with a user-facing message on bad input.
+    """
+    query = {}
+
+    for name in ("year_from", "year_to"):
+        value = params.get(name, "").strip()
+        if value:
+            try:
+                query[name] = int(value)
+            except ValueError:
+                raise ValueError(f"{name} must be a year, e.g. 2007.")
+    if query.get("year_from", 0) > query.get("year_to", float("inf")):
+        raise ValueError("year_from must not be after year_to.")
+
+    # Multiple values are passed by repeating the parameter, e.g. ?sex=Males&sex=Females
+    for name in FILTER_FIELDS:
+        values = sorted({value.strip() for value in params.getlist(name) if value.strip()})
+        if values:
+            query[name] = values
+
+    group_by = [field.strip() for field in params.get("group_by", "").split(",") if field.strip()]
+    unknown = [field for field in group_by if field not in GROUP_BY_FIELDS]
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(unknown)}. Choose from: {', '.join(GROUP_BY_FIELDS)}.")
+    # Keep the caller's column order but drop duplicates
+    query["group_by"] = list(dict.fromkeys(group_by)) or DEFAULT_GROUP_BY
+
+    return query
+
+
+def stats_etag(query, version):
+    """
+    Returns an ETag for a normalized query at a given data version.
+    The response body is fully determined by these two, so no need to hash the body itself.
+    """
+    digest = hashlib.sha1(json.dumps(query, sort_keys=True).encode()).hexdigest()
+    return f"{version}-{digest}"
+
+
+def get_cancer_stats(query, version):
+    """
+    Returns the gzip-compressed JSON body for a normalized query at a CancerData version.
+    Bodies are memoized per query and version, so each distinct query
+    hits the database and compressor once per data load.
+    """
+    cache_key = f"cancer-stats:{stats_etag(query, version)}"
+
+    body = cache.get(cache_key)
+    if body is None:
+        payload = {
+            "data_version": version,
+            "query": query,
+            "results": aggregate_cancer_data(query),
+        }
+        # mtime=0 keeps the bytes identical between workers for the same data
+        body = gzip.compress(json.dumps(payload).encode(), mtime=0)
+        cache.set(cache_key, body, CACHE_TIMEOUT)
+    return body
+
+
+def aggregate_cancer_data(query):
+    """
+    Sums CancerData counts for the filters in `query`, grouped by its group_by fields.
+    Each row holds the group_by values plus the summed `total`.
+    """
+    rows = CancerData.objects.all()
+    if "year_from" in query:
+        rows = rows.filter(year__gte=query["year_from"])
+    if "year_to" in query:
+        rows = rows.filter(year__lte=query["year_to"])
+    for name in FILTER_FIELDS:
+        if name in query:
+            rows = rows.filter(**{f"{name}__in": query[name]})
+
+    group_by = query["group_by"]
+    rows = rows.values(*group_by).annotate(total=Sum("count")).order_by(*group_by)
+    return list(rows)
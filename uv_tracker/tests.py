@@ -1,3 +1,493 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from uv_tracker import budget, utils
+from uv_tracker.budget import BLOCK_INITIAL_SECONDS
+from uv_tracker.management.commands import load_cancer_data
+from uv_tracker.management.commands.load_cancer_data import clean_int
+from uv_tracker.management.commands.replay_traffic import StubResponse, StubUpstream
+from uv_tracker.middleware import MAX_VALUE_LENGTH, client_hash, pseudonymize, sanitize_query
+from uv_tracker.models import CancerData, DataVersion, Reminder
+from uv_tracker.reminders import DATABASE_RETRY_DELAY, RETRY_DELAY, LocMemBackend, ReminderScheduler
+from uv_tracker.stats import parse_stats_query
+
+
+def write_temp_file(content, suffix):
+    f = tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False, newline="")
+    f.write(content)
+    f.close()
+    return f.name
+
+
+class LoadCancerDataTests(TestCase):
+    # AIHW-style sheet: title rows above the header and spelled-out column names
+    CSV = (
+        "Cancer data in Australia\n"
+        "\n"
+        "Data type,Cancer group/site,Year,Sex,State or Territory,Count\n"
+        "Incidence,Melanoma of the skin,2007,Males,VIC,\"1,234\"\n"
+        "Incidence,Melanoma of the skin,2007,Females,VIC,900\n"
+        "Mortality,Melanoma of the skin,2007,Males,,n.p.\n"
+    )
+
+    def load(self, content, *args):
+        path = write_temp_file(content, ".csv")
+        self.addCleanup(os.remove, path)
+        out = StringIO()
+        call_command("load_cancer_data", path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_clean_int(self):
+        self.assertEqual(clean_int("1,234"), 1234)
+        self.assertEqual(clean_int(" 2007 "), 2007)
+        self.assertEqual(clean_int(2007.0), 2007)
+        for value in (None, "", "n.p.", "..", "nan", float("nan"), "inf", "Infinity", float("inf"),
+                      "99999999999999999999999", 2**31):
+            self.assertIsNone(clean_int(value), value)
+
+    def test_finds_header_and_cleans_rows(self):
+        output = self.load(self.CSV)
+
+        self.assertEqual(CancerData.objects.count(), 2)
+        row = CancerData.objects.get(sex="Males")
+        self.assertEqual((row.state, row.year, row.count), ("VIC", 2007, 1234))
+        self.assertEqual(row.cancer_type, "Melanoma of the skin")
+        self.assertIn("2 created, 0 updated, 0 unchanged, 0 duplicates, 1 skipped", output)
+        self.assertEqual(DataVersion.current(DataVersion.CANCER_DATA), 1)
+
+    def test_missing_header(self):
+        with self.assertRaisesMessage(CommandError, "Could not find a header row"):
+            self.load("a,b,c\n1,2,3\n")
+
+    def test_reload_updates_and_bumps_version(self):
+        self.load(self.CSV)
+        self.load(self.CSV.replace("900", "950"))
+
+        self.assertEqual(CancerData.objects.count(), 2)
+        self.assertEqual(CancerData.objects.get(sex="Females").count, 950)
+        self.assertEqual(DataVersion.current(DataVersion.CANCER_DATA), 2)
+
+        # Nothing changed, so the version stays put
+        output = self.load(self.CSV.replace("900", "950"))
+        self.assertIn("0 created, 0 updated, 2 unchanged", output)
+        self.assertEqual(DataVersion.current(DataVersion.CANCER_DATA), 2)
+
+    def test_duplicates_in_batch_are_reported(self):
+        csv = self.CSV + "Incidence,Melanoma of the skin,2007,Males,VIC,1300\n"
+        output = self.load(csv)
+
+        self.assertEqual(CancerData.objects.get(sex="Males").count, 1300)
+        self.assertIn("2 created, 0 updated, 0 unchanged, 1 duplicates, 1 skipped", output)
+
+    def test_lookup_reads_only_the_batch_keys(self):
+        CancerData.objects.bulk_create([
+            CancerData(state=state, year=2007, data_type="Incidence", count=1, cancer_type="Melanoma of the skin", sex=sex)
+            for state in ("VIC", "NSW", "QLD", None)
+            for sex in ("Males", "Females", None)
+        ])
+        keys = [
+            ("VIC", 2007, "Incidence", "Melanoma of the skin", "Males"),
+            (None, 2007, "Incidence", "Melanoma of the skin", None),
+            ("VIC", 2007, "Incidence", "Melanoma of the skin", None),
+            ("TAS", 2007, "Incidence", "Melanoma of the skin", "Males"),
+        ]
+
+        with mock.patch.object(load_cancer_data, "LOOKUP_CHUNK_SIZE", 3):
+            existing = load_cancer_data.Command().find_existing(keys)
+        self.assertEqual(set(existing), set(keys[:3]))
+
+    def test_failed_batch_still_bumps_version(self):
+        real_upsert = load_cancer_data.Command.upsert
+        calls = []
+
+        def upsert(command, batch):
+            calls.append(batch)
+            if len(calls) > 1:
+                raise RuntimeError("boom")
+            return real_upsert(command, batch)
+
+        with mock.patch.object(load_cancer_data.Command, "upsert", upsert):
+            with self.assertRaises(RuntimeError):
+                self.load(self.CSV, "--batch-size", "1")
+
+        self.assertEqual(CancerData.objects.count(), 1)
+        self.assertEqual(DataVersion.current(DataVersion.CANCER_DATA), 1)
+
+
+class ReminderSchedulerTests(TestCase):
+    def setUp(self):
+        LocMemBackend.outbox = []
+        self.now = timezone.now()
+
+    def test_one_off_reminder_is_deactivated(self):
+        reminder = Reminder.objects.create(recipient="a", next_fire_at=self.now - timedelta(minutes=1), interval=None)
+        scheduler = ReminderScheduler(backend=LocMemBackend())
+        scheduler.load()
+        scheduler.fire_due(self.now)
+
+        self.assertEqual([r.id for r in LocMemBackend.outbox], [reminder.id])
+        reminder.refresh_from_db()
+        self.assertFalse(reminder.active)
+        self.assertIsNotNone(reminder.last_fired_at)
+        self.assertEqual(scheduler.heap, [])
+
+    def test_missed_periods_are_skipped(self):
+        due = self.now - timedelta(hours=5)
+        reminder = Reminder.objects.create(recipient="a", next_fire_at=due, interval=timedelta(hours=2))
+        scheduler = ReminderScheduler(backend=LocMemBackend())
+        scheduler.load()
+        scheduler.fire_due(self.now)
+
+        # Delivered once, not once per missed period, and moved to the next slot after now
+        self.assertEqual(len(LocMemBackend.outbox), 1)
+        reminder.refresh_from_db()
+        self.assertTrue(reminder.active)
+        self.assertEqual(reminder.next_fire_at, due + timedelta(hours=6))
+        self.assertEqual(scheduler.heap, [(reminder.next_fire_at.timestamp(), reminder.id)])
+
+    def test_backend_failure_is_retried(self):
+        due = self.now - timedelta(minutes=1)
+        reminder = Reminder.objects.create(recipient="a", next_fire_at=due, interval=None)
+        backend = LocMemBackend()
+        scheduler = ReminderScheduler(backend=backend)
+        scheduler.load()
+
+        with mock.patch.object(backend, "send", side_effect=RuntimeError("down")):
+            scheduler.fire_due(self.now)
+        reminder.refresh_from_db()
+        self.assertTrue(reminder.active)
+        self.assertEqual(reminder.next_fire_at, due)
+
+        # Nothing happens before the retry delay, then it is delivered
+        scheduler.fire_due(self.now + timedelta(seconds=RETRY_DELAY - 1))
+        self.assertEqual(LocMemBackend.outbox, [])
+        scheduler.fire_due(self.now + timedelta(seconds=RETRY_DELAY))
+        self.assertEqual([r.id for r in LocMemBackend.outbox], [reminder.id])
+
+    def test_restart_reloads_from_database(self):
+        reminder = Reminder.objects.create(recipient="a", next_fire_at=self.now - timedelta(minutes=1))
+        first = ReminderScheduler(backend=LocMemBackend())
+        first.load()
+        first.fire_due(self.now)
+
+        # A fresh scheduler picks up the rescheduled time and doesn't fire it again early
+        second = ReminderScheduler(backend=LocMemBackend())
+        self.assertEqual(second.load(), 1)
+        second.fire_due(self.now + timedelta(hours=1))
+        self.assertEqual(len(LocMemBackend.outbox), 1)
+        second.fire_due(self.now + timedelta(hours=2))
+        self.assertEqual(len(LocMemBackend.outbox), 2)
+        self.assertEqual(LocMemBackend.outbox[-1].id, reminder.id)
+
+    def test_run_survives_database_errors(self):
+        reminder = Reminder.objects.create(recipient="a", next_fire_at=self.now - timedelta(minutes=1), interval=None)
+        backend = LocMemBackend()
+        scheduler = ReminderScheduler(backend=backend)
+
+        def send(reminders):
+            LocMemBackend.outbox.extend(reminders)
+            scheduler.stop()
+
+        # The lookup of due reminders fails once, after their heap entries were popped
+        real_filter = Reminder.objects.filter
+        calls = []
+
+        def filter(*args, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise OperationalError("database is locked")
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(backend, "send", send), \
+                mock.patch.object(Reminder.objects, "filter", filter), \
+                mock.patch.object(scheduler.stopped, "wait") as wait, \
+                mock.patch("uv_tracker.reminders.close_old_connections") as close_old_connections:
+            scheduler.run()
+
+        close_old_connections.assert_called_once_with()
+        self.assertEqual(wait.call_args_list[0], mock.call(DATABASE_RETRY_DELAY))
+        self.assertEqual([r.id for r in LocMemBackend.outbox], [reminder.id])
+        reminder.refresh_from_db()
+        self.assertFalse(reminder.active)
+
+    def test_poll_picks_up_reminders_committed_late(self):
+        scheduler = ReminderScheduler(backend=LocMemBackend())
+        scheduler.load()
+        reminder = Reminder.objects.create(recipient="a", next_fire_at=self.now + timedelta(hours=1))
+        # Saved just before the previous poll started, but committed after it ran
+        Reminder.objects.filter(pk=reminder.pk).update(updated_at=scheduler.last_poll - timedelta(seconds=1))
+
+        self.assertEqual(scheduler.poll(), 1)
+        # The overlap doesn't queue it a second time
+        self.assertEqual(scheduler.poll(), 0)
+        self.assertEqual(len(scheduler.heap), 1)
+
+
+class CancerStatsTests(TestCase):
+    URL = "/api/cancer-stats/"
+
+    def setUp(self):
+        cache.clear()
+        CancerData.objects.bulk_create([
+            CancerData(state="VIC", year=2006, data_type="Incidence", count=5, cancer_type="Melanoma of the skin", sex="Males"),
+            CancerData(state="VIC", year=2007, data_type="Incidence", count=10, cancer_type="Melanoma of the skin", sex="Males"),
+            CancerData(state="VIC", year=2007, data_type="Incidence", count=20, cancer_type="Melanoma of the skin", sex="Females"),
+            CancerData(state="NSW", year=2008, data_type="Mortality", count=3, cancer_type="Melanoma of the skin", sex="Males"),
+        ])
+        DataVersion.bump(DataVersion.CANCER_DATA)
+
+    def get(self, query="", **extra):
+        return self.client.get(self.URL + query, secure=True, **extra)
+
+    def test_query_normalization(self):
+        query = parse_stats_query(QueryDict("sex=Males&sex=Females&sex=Males&year_from=2007&group_by=sex,year,sex"))
+        self.assertEqual(query, {"year_from": 2007, "sex": ["Females", "Males"], "group_by": ["sex", "year"]})
+        self.assertEqual(parse_stats_query(QueryDict(""))["group_by"], ["year"])
+
+        # Reordered parameters share one ETag
+        first = self.get("?sex=Males&sex=Females&year_from=2007")
+        second = self.get("?year_from=2007&sex=Females&sex=Males")
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_filters_and_group_by(self):
+        response = self.get("?year_from=2007&state=VIC&group_by=sex", HTTP_ACCEPT_ENCODING="identity")
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data["data_version"], 1)
+        self.assertEqual(data["results"], [{"sex": "Females", "total": 20}, {"sex": "Males", "total": 10}])
+
+    def test_bad_parameters(self):
+        for query in ("?year_from=abc", "?year_from=2010&year_to=2000", "?group_by=count"):
+            response = self.get(query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn("error", json.loads(response.content))
+
+    def test_etag_revalidation(self):
+        etag = self.get()["ETag"]
+        self.assertTrue(etag.startswith('W/"1-'))
+        not_modified = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["Vary"], "Accept-Encoding")
+
+        # A reload changes the version, so the old ETag no longer matches
+        DataVersion.bump(DataVersion.CANCER_DATA)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_gzip_and_identity(self):
+        compressed = self.get(HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+
+        plain = self.get(HTTP_ACCEPT_ENCODING="identity")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+    def test_version_is_read_once_per_request(self):
+        # A reload landing between the ETag check and the body must not mix versions
+        with mock.patch.object(DataVersion, "current", side_effect=[1, 2]):
+            response = self.get(HTTP_ACCEPT_ENCODING="identity")
+        self.assertTrue(response["ETag"].startswith('W/"1-'))
+        self.assertEqual(json.loads(response.content)["data_version"], 1)
+
+
+class TrafficCaptureTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_sanitize_query(self):
+        query = sanitize_query(QueryDict(
+            "lat=-37.812345&lon=144.963210&query=12 Smith St Fitzroy&token=secret&group_by=year"
+        ))
+        params = QueryDict(query)
+
+        self.assertEqual(params["lat"], "-37.81")
+        self.assertEqual(params["lon"], "144.96")
+        self.assertEqual(params["group_by"], "year")
+        self.assertNotIn("token", params)
+        # The address is replaced by a pseudonym of the same length
+        self.assertNotIn("Smith", query)
+        self.assertEqual(len(params["query"]), len("12 Smith St Fitzroy"))
+
+    def test_pseudonyms_keep_repeats(self):
+        self.assertEqual(pseudonymize("Northcote"), pseudonymize(" northcote "))
+        self.assertNotEqual(pseudonymize("Northcote"), pseudonymize("Fitzroy"))
+        self.assertEqual(len(pseudonymize("x" * 500)), MAX_VALUE_LENGTH)
+
+    def test_client_hash(self):
+        factory = RequestFactory()
+        first = client_hash(factory.get("/", REMOTE_ADDR="203.0.113.5"))
+
+        self.assertEqual(first, client_hash(factory.get("/other/", REMOTE_ADDR="203.0.113.5")))
+        self.assertNotEqual(first, client_hash(factory.get("/", REMOTE_ADDR="203.0.113.6")))
+        self.assertEqual(len(first), 12)
+        self.assertNotIn("203", first)
+
+    def test_middleware_writes_log(self):
+        path = write_temp_file("", ".log")
+        self.addCleanup(os.remove, path)
+        with override_settings(TRAFFIC_CAPTURE_LOG=path):
+            self.client.get("/", {"query": "12 Smith St"}, secure=True)
+            self.client.get("/static/css/styles.css", secure=True)
+
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["p"], "/")
+        self.assertEqual(records[0]["s"], 200)
+        self.assertNotIn("Smith", records[0]["q"])
+
+    def test_replay(self):
+        lines = [
+            {"t": 100.0, "m": "GET", "p": "/address-suggestions/", "q": "query=" + pseudonymize("North"), "c": "aa0001", "x": 1},
+            {"t": 100.1, "m": "GET", "p": "/address-suggestions/", "q": "query=" + pseudonymize("North"), "c": "aa0001", "x": 1},
+            {"t": 100.2, "m": "GET", "p": "/uv-index/", "q": "lat=-37.81&lon=144.96", "c": "bb0002", "x": 1},
+        ]
+        path = write_temp_file("".join(json.dumps(line) + "\n" for line in lines) + "not json\n", ".log")
+        self.addCleanup(os.remove, path)
+
+        out = StringIO()
+        call_command("replay_traffic", path, "--speed", "100", "--concurrency", "1", stdout=out, stderr=StringIO())
+        output = out.getvalue()
+
+        self.assertIn("Replayed 3 requests", output)
+        self.assertIn("200=3", output)
+        # The repeated suggestion query is served from cache
+        self.assertIn("api.mapbox.com: 1", output)
+        self.assertIn("api.weatherapi.com: 1", output)
+
+
+class UpstreamBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        budget_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(budget_dir.cleanup)
+        settings = override_settings(
+            UPSTREAM_BUDGET_DIR=budget_dir.name,
+            UPSTREAM_BUDGETS={
+                "weatherapi": {"capacity": 10, "refill_per_second": 1.0},
+                "mapbox": {"capacity": 10, "refill_per_second": 1.0},
+            },
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        clock = mock.patch("uv_tracker.budget.time")
+        self.clock = clock.start().time
+        self.clock.return_value = 1000.0
+        self.addCleanup(clock.stop)
+
+    def test_acquire_until_empty_then_refill(self):
+        bucket = budget.get_budget("weatherapi")
+        self.assertEqual([bucket.acquire() for _ in range(11)], [True] * 10 + [False])
+
+        self.clock.return_value += 3
+        self.assertEqual([bucket.acquire() for _ in range(4)], [True] * 3 + [False])
+
+        status = bucket.status()
+        self.assertEqual(status["granted"], {"interactive": 13})
+        self.assertEqual(status["denied"], {"interactive": 2})
+        self.assertGreater(status["burn_per_minute"], 0)
+
+    def test_background_leaves_reserve_for_interactive(self):
+        bucket = budget.get_budget("weatherapi")
+        results = []
+
+        def background():
+            while bucket.acquire(budget.BACKGROUND):
+                results.append(budget.BACKGROUND)
+
+        threads = [threading.Thread(target=background) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Background work stopped at the reserve, the rest is still there for users
+        self.assertEqual(len(results), 5)
+        self.assertEqual([bucket.acquire() for _ in range(6)], [True] * 5 + [False])
+
+    def test_block_holds_calls_back_with_backoff(self):
+        bucket = budget.get_budget("weatherapi")
+        bucket.block()
+
+        # Refilling alone doesn't reopen the bucket
+        self.clock.return_value += BLOCK_INITIAL_SECONDS - 1
+        self.assertFalse(bucket.acquire())
+        self.clock.return_value += 1
+        self.assertTrue(bucket.acquire())
+
+        # Another quota error right away doubles the wait
+        bucket.block()
+        self.clock.return_value += BLOCK_INITIAL_SECONDS
+        self.assertFalse(bucket.acquire())
+        self.clock.return_value += BLOCK_INITIAL_SECONDS
+        self.assertTrue(bucket.acquire())
+
+    def test_block_from_requests_in_flight_does_not_back_off(self):
+        bucket = budget.get_budget("weatherapi")
+        for _ in range(5):
+            bucket.block()
+        self.assertEqual(bucket.status()["blocked_for"], BLOCK_INITIAL_SECONDS)
+
+        self.clock.return_value += BLOCK_INITIAL_SECONDS
+        self.assertTrue(bucket.acquire())
+
+    def test_block_until_reset_time(self):
+        bucket = budget.get_budget("mapbox")
+        bucket.block(until=self.clock.return_value + 5)
+        self.assertEqual(bucket.status()["blocked_for"], 5)
+        self.clock.return_value += 5
+        self.assertTrue(bucket.acquire())
+
+    def test_bad_state_file_starts_fresh(self):
+        bucket = budget.get_budget("weatherapi")
+        for content in ("{}", '{"tokens": 3}', "[1, 2]", "not json"):
+            with open(bucket.path, "w") as f:
+                f.write(content)
+            self.assertTrue(bucket.acquire(), content)
+
+    def test_uv_index_falls_back_to_stale_cache(self):
+        stale = {"current": {"uv": 3, "temp_c": 10}, "location": {"name": "Fitzroy", "region": "Victoria"}}
+        utils.set_cached("uv:-37.80,144.98", stale, fresh_for=-1)
+        quota_error = StubResponse({"error": {"code": 2007, "message": "quota exceeded"}})
+
+        with mock.patch.object(requests, "get", return_value=quota_error) as get:
+            self.assertEqual(utils.get_uv_index(-37.80, 144.98), (3, 10, "Fitzroy, Victoria"))
+            # The quota error blocked the budget, so nothing else is sent upstream
+            self.assertEqual(utils.get_uv_index(-37.80, 144.98), (3, 10, "Fitzroy, Victoria"))
+            self.assertEqual(utils.get_uv_index(-38.00, 145.00), (0, 0, "Error fetching data"))
+        self.assertEqual(get.call_count, 1)
+
+    def test_uv_index_uses_fresh_cache(self):
+        upstream = StubUpstream()
+        with mock.patch.object(requests, "get", upstream.get):
+            first = utils.get_uv_index(-37.81, 144.96)
+            self.assertEqual(utils.get_uv_index(-37.812, 144.961), first)
+        self.assertEqual(upstream.calls["api.weatherapi.com"], 1)
+
+    def test_address_suggestions_fall_back_to_stale_cache(self):
+        stale = [{"name": "Northcote, Victoria, Australia", "suburb": "Northcote", "postcode": "3070", "lat": -37.77, "lon": 144.99}]
+        utils.set_cached(utils.suggestion_cache_key("North"), stale, fresh_for=-1)
+        rate_limited = StubResponse({}, status_code=429, headers={"X-Rate-Limit-Reset": str(int(self.clock.return_value) + 30)})
+
+        with mock.patch.object(requests, "get", return_value=rate_limited) as get:
+            self.assertEqual(utils.get_address_suggestions("north "), stale)
+            self.assertEqual(utils.get_address_suggestions("Fitz"), [])
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(budget.get_budget("mapbox").status()["blocked_for"], 30)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('address-suggestions/', views.address_suggestions, name='address_suggestions'),
     path("personalization/", views.personalization, name="personalization"),
     path('uv-impact/', views.uv_impact, name='uv_impact'),
+    path('api/cancer-stats/', views.cancer_stats, name='cancer_stats'),
     path('set-reminder/', views.set_reminder, name='set_reminder'),
     path('clothing/', views.clothing, name='clothing'),
 ]
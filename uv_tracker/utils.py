@@ -1,6 +1,32 @@
+import hashlib
+import time
 import requests
 from django.conf import settings
+from django.core.cache import cache
 import bleach
+from . import budget
+
+# How long upstream results are served without asking the API again
+UV_FRESH_FOR = 10 * 60
+PLACES_FRESH_FOR = 24 * 60 * 60
+# Older results are kept this long as a fallback for when the upstream budget runs out
+STALE_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+# WeatherAPI error codes meaning the key can't be used right now (rather than a bad location)
+WEATHERAPI_QUOTA_ERRORS = {1002, 2006, 2007, 2008, 2009}
+
+
+def get_cached(key):
+    """
+    Returns (value, is_fresh) for a key written by set_cached, or (None, False) if there is none.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None, False
+    return entry["value"], entry["fresh_until"] > time.time()
+
+def set_cached(key, value, fresh_for):
+    cache.set(key, {"value": value, "fresh_until": time.time() + fresh_for}, STALE_CACHE_TIMEOUT)
 
 
 # Update this function in utils.py
@@ -8,83 +34,154 @@ def get_uv_index(lat, lon, location_name=None):
     """
     Fetches UV index and temperature from WeatherAPI using latitude & longitude.
     Allows passing a location name to use instead of the WeatherAPI one.
+    Results are cached per ~1 km; when the WeatherAPI budget is used up a stale result is returned instead.
+    """
+    # Nearby coordinates share one cache entry (2 decimal places is about 1 km)
+    cache_key = f"uv:{float(lat):.2f},{float(lon):.2f}"
+    cached, fresh = get_cached(cache_key)
+    if fresh:
+        data = cached
+    elif not budget.acquire("weatherapi"):
+        print("WeatherAPI budget exhausted, using cached data")
+        if cached is None:
+            return (0, 0, "Error fetching data")
+        data = cached
+    else:
+        data = fetch_current_weather(lat, lon)
+        if data is None:
+            # Upstream failed, a stale result is better than nothing
+            if cached is None:
+                return (0, 0, "Error fetching data")
+            data = cached
+        elif "error" in data:
+            error_msg = data.get("error", {}).get("message", "Invalid Location")
+            print(f"WeatherAPI error: {error_msg}")
+            return (0, 0, "Invalid Location")
+        else:
+            set_cached(cache_key, data, UV_FRESH_FOR)
+
+    uv_index = data.get("current", {}).get("uv", 0)
+    temperature = data.get("current", {}).get("temp_c", 0)
+
+    # Debug the location data returned
+    location_data = data.get("location", {})
+    print(f"WeatherAPI location data: {location_data}")
+
+    # Use the provided location name if available
+    if location_name:
+        city = location_name
+    else:
+        # Get more detailed location info
+        city = location_data.get("name", "Unknown Location")
+        region = location_data.get("region", "")
+        country = location_data.get("country", "")
+
+        # Format the location display
+        if region:
+            city = f"{city}, {region}"
+        # Add country only if it's not Australia (to keep it concise)
+        elif country and country != "Australia":
+            city = f"{city}, {country}"
+
+    return (uv_index, temperature, city)
+
+def fetch_current_weather(lat, lon):
+    """
+    Calls the WeatherAPI current conditions endpoint.
+    Returns the parsed response (which may contain a location "error"),
+    or None if the request failed or the API key is out of quota.
     """
     API_KEY = settings.API_KEY  # Ensure this is set in settings.py
     UV_API_URL = "https://api.weatherapi.com/v1/current.json"
 
     url = f"{UV_API_URL}?key={API_KEY}&q={lat},{lon}"
-    
+
     # Log the API call for debugging
     print(f"Calling WeatherAPI with coordinates: {lat}, {lon}")
 
     try:
         response = requests.get(url)
         data = response.json()
-
-        if "error" in data:
-            error_msg = data.get("error", {}).get("message", "Invalid Location")
-            print(f"WeatherAPI error: {error_msg}")
-            return (0, 0, "Invalid Location")
-
-        uv_index = data.get("current", {}).get("uv", 0)
-        temperature = data.get("current", {}).get("temp_c", 0)
-        
-        # Debug the location data returned
-        location_data = data.get("location", {})
-        print(f"WeatherAPI location data: {location_data}")
-        
-        # Use the provided location name if available
-        if location_name:
-            city = location_name
-        else:
-            # Get more detailed location info
-            city = location_data.get("name", "Unknown Location")
-            region = location_data.get("region", "")
-            country = location_data.get("country", "")
-            
-            # Format the location display
-            if region:
-                city = f"{city}, {region}"
-            # Add country only if it's not Australia (to keep it concise)
-            elif country and country != "Australia":
-                city = f"{city}, {country}"
-
-        return (uv_index, temperature, city)
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         print("Error fetching UV data:", e)
-        return (0, 0, "Error fetching data")
+        return None
+
+    if "error" in data and data["error"].get("code") in WEATHERAPI_QUOTA_ERRORS:
+        print(f"WeatherAPI quota error: {data['error'].get('message')}")
+        # Stop every worker from spending calls that will fail anyway
+        budget.get_budget("weatherapi").block()
+        return None
+    return data
 
 def get_uv_index_from_city(city):
     """
     Converts city name to latitude/longitude and fetches UV index.
+    Coordinates are cached, so repeated suburbs don't cost a lookup.
     """
     GEO_API_URL = "https://api.weatherapi.com/v1/search.json"
     API_KEY = settings.API_KEY
 
-    try:
-        geo_url = f"{GEO_API_URL}?key={API_KEY}&q={city}"
-        geo_response = requests.get(geo_url)
-        geo_data = geo_response.json()
-
-        if geo_data and isinstance(geo_data, list) and len(geo_data) > 0:
-            # Use the first match
-            lat, lon = geo_data[0]['lat'], geo_data[0]['lon']
-            return get_uv_index(float(lat), float(lon))
+    cache_key = "geo:" + hashlib.sha1(city.strip().lower().encode()).hexdigest()
+    cached, fresh = get_cached(cache_key)
+    if not fresh:
+        if budget.acquire("weatherapi"):
+            try:
+                geo_url = f"{GEO_API_URL}?key={API_KEY}&q={city}"
+                geo_response = requests.get(geo_url)
+                geo_data = geo_response.json()
+
+                if geo_data and isinstance(geo_data, list) and len(geo_data) > 0:
+                    # Use the first match
+                    cached = (float(geo_data[0]['lat']), float(geo_data[0]['lon']))
+                    set_cached(cache_key, cached, PLACES_FRESH_FOR)
+                elif isinstance(geo_data, dict) and geo_data.get("error", {}).get("code") in WEATHERAPI_QUOTA_ERRORS:
+                    print(f"WeatherAPI quota error: {geo_data['error'].get('message')}")
+                    budget.get_budget("weatherapi").block()
+                else:
+                    return (0, 0, "Location not found")
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print("Error fetching location data:", e)
         else:
-            return (0, 0, "Location not found")
-    except requests.exceptions.RequestException as e:
-        print("Error fetching location data:", e)
-        return (0, 0, "Error fetching data")
+            print("WeatherAPI budget exhausted, using cached location")
+
+        if cached is None:
+            return (0, 0, "Error fetching data")
+
+    lat, lon = cached
+    return get_uv_index(lat, lon)
+
+def suggestion_cache_key(query):
+    # Case and surrounding spaces don't change Mapbox's answer
+    return "suggest:" + hashlib.sha1(query.strip().lower().encode()).hexdigest()
 
 def get_address_suggestions(query):
     """
     Get address suggestions for autocomplete based on user input.
     Uses Mapbox Places API for accurate address suggestions.
     Restricted to Victoria, Australia only.
+    Suggestions are cached per query; when the Mapbox budget is used up a stale result is returned instead.
     """
     if not query or len(query) < 2:
         return []
-        
+
+    cache_key = suggestion_cache_key(query)
+    cached, fresh = get_cached(cache_key)
+    if fresh:
+        return cached
+    if not budget.acquire("mapbox"):
+        print("Mapbox budget exhausted, using cached suggestions")
+        return cached or []
+
+    locations = fetch_address_suggestions(query)
+    if locations is None:
+        return cached or []
+    set_cached(cache_key, locations, PLACES_FRESH_FOR)
+    return locations
+
+def fetch_address_suggestions(query):
+    """
+    Calls the Mapbox Geocoding API. Returns None if the request failed.
+    """
     API_KEY = settings.MAPBOX_API_KEY
     GEOCODING_URL = settings.MAPBOX_GEOCODING_URL
     
@@ -109,9 +206,16 @@ def get_address_suggestions(query):
         }
         
         response = requests.get(endpoint, params=params)
+        if response.status_code == 429:
+            print("Mapbox API Error: rate limit exceeded")
+            # Stop every worker from spending calls that will fail anyway,
+            # until the reset time Mapbox reports if it sent one
+            reset = response.headers.get("X-Rate-Limit-Reset")
+            budget.get_budget("mapbox").block(float(reset) if reset and reset.isdigit() else None)
+            return None
         if response.status_code != 200:
             print(f"Mapbox API Error: {response.status_code}")
-            return []
+            return None
             
         data = response.json()
         
@@ -171,4 +275,4 @@ def get_address_suggestions(query):
         
     except Exception as e:
         print(f"Error fetching address suggestions: {e}")
-        return []
+        return None
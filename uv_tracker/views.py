@@ -4,13 +4,21 @@ import seaborn as sns
 import pandas as pd
 import io
 import base64
+import gzip
+import re
 from django.shortcuts import render
-from uv_tracker.models import CancerData  # Import the model
-from django.http import JsonResponse
+from uv_tracker.models import CancerData, DataVersion  # Import the models
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import condition, require_GET
+from django.views.decorators.vary import vary_on_headers
 from .utils import get_uv_index, get_uv_index_from_city, get_address_suggestions
+from .stats import parse_stats_query, stats_etag, get_cancer_stats
 from django_ratelimit.decorators import ratelimit
 
+# Same check Django's GZipMiddleware uses
+accepts_gzip = re.compile(r"\bgzip\b")
+
 def home(request):
     return render(request, 'home.html')
 
@@ -249,6 +257,49 @@ def uv_impact(request):
 
     
 
+def cancer_stats_version(request):
+    """
+    Reads the CancerData version once per request, so the ETag and the body
+    can't disagree if a reload lands in between.
+    """
+    if not hasattr(request, "cancer_data_version"):
+        request.cancer_data_version = DataVersion.current(DataVersion.CANCER_DATA)
+    return request.cancer_data_version
+
+def cancer_stats_etag(request):
+    """
+    ETag for cancer_stats, computed before the view runs so unchanged results get a 304.
+    Weak because the same data is served gzip-compressed or not depending on the client.
+    """
+    try:
+        query = parse_stats_query(request.GET)
+    except ValueError:
+        return None
+    return f'W/"{stats_etag(query, cancer_stats_version(request))}"'
+
+@require_GET
+@ratelimit(key='ip', rate='60/m')
+@vary_on_headers("Accept-Encoding")  # Outside @condition so 304s carry it too
+@condition(etag_func=cancer_stats_etag)
+def cancer_stats(request):
+    """
+    JSON API over CancerData.
+    Filters: year_from, year_to, state, sex, cancer_type, data_type (repeat a parameter for several values).
+    group_by: comma-separated list of year, state, sex, cancer_type, data_type (default: year).
+    """
+    try:
+        query = parse_stats_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    body = get_cancer_stats(query, cancer_stats_version(request))  # Already gzip-compressed
+    if accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+        response = HttpResponse(body, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(gzip.decompress(body), content_type="application/json")
+    return response
+
 def set_reminder(request):
     return render(request, 'set_reminder.html')
 